@@ -1,22 +1,38 @@
+import asyncio
+import base64
+import binascii
+import fcntl
+import hashlib
+import hmac
+import json
 import os
 import secrets
+import struct
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from urllib.parse import urlparse
 import uuid
-from io import BytesIO
 
+import anyio
 import bcrypt
 import cloudinary
 import cloudinary.uploader
-from fastapi import FastAPI, Request, Form, Depends, HTTPException, Cookie, UploadFile
+import orjson
+import redis
+from fastapi import FastAPI, Request, Form, Query, Depends, HTTPException, Cookie, UploadFile, File
 from fastapi.responses import RedirectResponse, HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from itsdangerous import URLSafeTimedSerializer
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Boolean
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+from sqlalchemy import create_engine, event, func, inspect, text, update, case, Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, Session, relationship
+from sqlalchemy.orm import sessionmaker, Session, relationship, selectinload, raiseload, make_transient_to_detached
 
 # ===========================
 # DATABASE SETUP
@@ -28,8 +44,30 @@ if DATABASE_URL and DATABASE_URL.startswith("postgres://"):
 if not DATABASE_URL:
     DATABASE_URL = "sqlite:///./db.sqlite3"
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {})
-SessionLocal = sessionmaker(bind=engine)
+if "sqlite" in DATABASE_URL:
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragma(dbapi_conn, _):
+        cursor = dbapi_conn.cursor()
+        # WAL: читатели не блокируются, пока идёт запись
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # В режиме WAL достаточно NORMAL: без лишнего fsync на каждый commit
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")  # 256 MB
+        cursor.execute("PRAGMA cache_size=-65536")  # 64 MB
+        cursor.close()
+else:
+    engine = create_engine(
+        DATABASE_URL,
+        pool_size=20,
+        max_overflow=10,
+        pool_timeout=30,
+        pool_pre_ping=True,
+        pool_recycle=1800
+    )
+SessionLocal = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 # ===========================
@@ -50,12 +88,24 @@ class User(Base):
     achievements = relationship("Achievement", back_populates="user")
 
     def check_password(self, password: str) -> bool:
-        password_bytes = password.encode('utf-8')[:72]
-        return bcrypt.checkpw(password_bytes, self.password_hash.encode('utf-8'))
+        return verify_password(password, self.password_hash)
+
+    def password_needs_rehash(self) -> bool:
+        if not self.password_hash.startswith(ARGON2_PREFIX):
+            return True
+        return PH.check_needs_rehash(self.password_hash)
+
+
+# Достижение с файлом, который ещё загружается в Cloudinary: в списках и модерации не показывается
+ACHIEVEMENT_UPLOADING = "uploading"
 
 
 class Achievement(Base):
     __tablename__ = "achievements"
+    __table_args__ = (
+        Index("ix_ach_user_status", "user_id", "status"),
+        Index("ix_ach_status_created", "status", "created_at"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     achievement_type = Column(String, default="oqushy_status")
@@ -72,26 +122,184 @@ class Achievement(Base):
     user = relationship("User", back_populates="achievements")
 
 
-Base.metadata.create_all(bind=engine)
+# Индексы, которые больше не нужны: выборки по user_id покрывает ix_ach_user_status
+OBSOLETE_ACHIEVEMENT_INDEXES = ("ix_achievements_user_id", "ix_ach_user_created")
+
+
+def init_db():
+    """Создаёт таблицы, индексы и применяет миграции.
+    
+    Запускается один раз при деплое (release в Procfile). DDL выполняется,
+    только если чего-то не хватает, повторный запуск ничего не меняет.
+    """
+    Base.metadata.create_all(bind=engine)
+    # create_all не добавляет индексы в уже существующие таблицы
+    for index in Achievement.__table__.indexes:
+        index.create(bind=engine, checkfirst=True)
+    
+    existing = {index["name"] for index in inspect(engine).get_indexes("achievements")}
+    obsolete = [name for name in OBSOLETE_ACHIEVEMENT_INDEXES if name in existing]
+    if obsolete:
+        with engine.begin() as conn:
+            for name in obsolete:
+                conn.execute(text(f"DROP INDEX {name}"))
+
+
+INIT_DB_LOCK_FILE = "/tmp/jetistik_init_db.lock"
+INIT_DB_ADVISORY_LOCK = 7346  # Произвольный номер для pg_advisory_lock
+
+
+def init_db_locked():
+    """Выполняет init_db под блокировкой, чтобы процессы не создавали схему наперегонки"""
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": INIT_DB_ADVISORY_LOCK})
+            try:
+                init_db()
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": INIT_DB_ADVISORY_LOCK})
+    else:
+        with open(INIT_DB_LOCK_FILE, "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            init_db()
+
+
+def ensure_schema():
+    """При старте воркера только проверяет, что таблицы есть.
+    
+    На пустой БД (первый запуск без release-шага) создаёт схему сама.
+    """
+    inspector = inspect(engine)
+    if all(inspector.has_table(table) for table in Base.metadata.tables):
+        return
+    init_db_locked()
 
 # ===========================
 # PASSWORD HASHING
 # ===========================
+# Новые пароли хэшируются argon2id; bcrypt-хэши переводятся на argon2 при входе.
+# Параметры подобраны так, чтобы проверка занимала столько же, сколько bcrypt
+# с cost 12 (~0.3 с на одном ядре): по времени ответа нельзя отличить
+# неизвестный логин, старый bcrypt-аккаунт и аккаунт с argon2.
+# parallelism=1, как и у bcrypt, чтобы соотношение не зависело от числа ядер
+PH = PasswordHasher(time_cost=6, memory_cost=65536, parallelism=1)
+ARGON2_PREFIX = "$argon2"
+
+# Каждое хэширование argon2 занимает 64 МБ памяти. Пул потоков большой (THREADPOOL_SIZE),
+# поэтому одновременно хэшируем не больше, чем есть ядер - иначе запросы
+# к /login и /register могли бы занять гигабайты памяти
+PASSWORD_HASH_CONCURRENCY = os.cpu_count() or 1
+_password_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_CONCURRENCY)
+
+
 def hash_password(password: str) -> str:
-    password_bytes = password.encode('utf-8')[:72]
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password_bytes, salt).decode('utf-8')
+    with _password_hash_slots:
+        return PH.hash(password)
+
+
+# Более длинные пароли отклоняются до хэширования
+MAX_PASSWORD_LENGTH = 1024
+
+# Кэш успешных проверок: ключ - (HMAC пароля, хэш из БД), сам пароль не хранится.
+# Ключ HMAC случайный и живёт только в памяти процесса: это защищает, если ключи
+# кэша попадут в логи или сериализованные данные. От дампа памяти это не
+# защищает - там есть и ключ HMAC, и перебор стоит один SHA-256 на пароль.
+# После смены пароля хэш в БД другой, поэтому старые записи больше не совпадают
+VERIFIED_PASSWORDS_MAX = 4096
+_verified_passwords = OrderedDict()
+_verified_passwords_lock = threading.Lock()
+_VERIFIED_PASSWORDS_KEY = secrets.token_bytes(32)
+
+
+def _check_password_hash(password: str, password_hash: str) -> bool:
+    with _password_hash_slots:
+        if password_hash.startswith(ARGON2_PREFIX):
+            try:
+                return PH.verify(password_hash, password)
+            except (VerificationError, InvalidHashError):
+                return False
+        # Старые пароли хранятся в bcrypt
+        # bcrypt учитывает только первые 72 байта: кодируем не больше 72 символов
+        password_bytes = password[:72].encode('utf-8')[:72]
+        return bcrypt.checkpw(password_bytes, password_hash.encode('utf-8'))
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    password_mac = hmac.new(_VERIFIED_PASSWORDS_KEY, password.encode('utf-8'), hashlib.sha256).digest()
+    key = (password_mac, password_hash)
+    with _verified_passwords_lock:
+        if key in _verified_passwords:
+            _verified_passwords.move_to_end(key)
+            return True
+    
+    if not _check_password_hash(password, password_hash):
+        return False
+    
+    with _verified_passwords_lock:
+        _verified_passwords[key] = True
+        if len(_verified_passwords) > VERIFIED_PASSWORDS_MAX:
+            _verified_passwords.popitem(last=False)
+    return True
+
+
+# Хэш случайной строки: проверяется, когда пользователь не найден,
+# чтобы время ответа не выдавало существование логина.
+# Совпадение с bcrypt приблизительное: соотношение измерено на одной машине
+# и на другом железе может немного отличаться. Старые argon2-хэши (t=2, p=2)
+# пересчитываются с новыми параметрами при следующем входе
+_DUMMY_HASH = "$argon2id$v=19$m=65536,t=6,p=1$wEF9KaOTZjTS6S2fiDJMKQ$v/W4hQhp4Y4fUjhTuw4ellZ3preR56OauRQw9PLl098"
+
+
+def dummy_check_password(password: str) -> bool:
+    _check_password_hash(password, _DUMMY_HASH)
+    return False
 
 
 # ===========================
 # APP SETUP
 # ===========================
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles с заголовком Cache-Control, чтобы браузер не запрашивал файлы повторно"""
+    def __init__(self, *args, cache_control: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = cache_control
+    
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = self.cache_control
+        return response
+
+
 app = FastAPI()
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Имена файлов в static не содержат хэша, поэтому кэшируем на неделю, а не навсегда
+app.mount(
+    "/static",
+    CachedStaticFiles(directory="static", cache_control="public, max-age=604800"),
+    name="static"
+)
 
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
-app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
+# Загруженные файлы могут быть удалены вместе с достижением - кэшируем на сутки
+app.mount(
+    "/uploads",
+    CachedStaticFiles(directory=UPLOAD_DIR, cache_control="public, max-age=86400"),
+    name="uploads"
+)
+
+@app.on_event("startup")
+def prepare_database():
+    ensure_schema()
+
+
+# Синхронные обработчики выполняются в пуле потоков anyio. Само хэширование
+# паролей дополнительно ограничено PASSWORD_HASH_CONCURRENCY
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", "64"))
+
+
+@app.on_event("startup")
+async def configure_threadpool():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
 
 # ===========================
 # CLOUDINARY SETUP
@@ -103,12 +311,264 @@ cloudinary.config(
     secure=True
 )
 
-templates = Jinja2Templates(directory="templates")
+# ===========================
+# TEMPLATES
+# ===========================
+# Скомпилированные шаблоны кэшируются на диске, чтобы после перезапуска не парсить их заново
+JINJA_CACHE_DIR = "/tmp/jinja_cache"
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+
+jinja_env = Environment(
+    loader=FileSystemLoader("templates"),
+    bytecode_cache=FileSystemBytecodeCache(JINJA_CACHE_DIR),
+    autoescape=True,
+    auto_reload=os.getenv("ENV") != "prod",  # В продакшене не проверяем изменения файлов
+    cache_size=400
+)
+templates = Jinja2Templates(env=jinja_env)
+
+
+@app.on_event("startup")
+def warm_templates():
+    """Компилирует все шаблоны при старте процесса"""
+    for name in jinja_env.list_templates():
+        jinja_env.get_template(name)
+
+
+SECRET_KEY = os.getenv("SECRET_KEY")
+if not SECRET_KEY:
+    # Случайный ключ у каждого воркера свой: cookie одного воркера не принимались бы другими
+    raise RuntimeError("SECRET_KEY не задан: укажите его в переменных окружения")
+
+
+class OrjsonSerializer:
+    """Сериализация данных токенов через orjson (вместо стандартного json)"""
+    @staticmethod
+    def dumps(obj) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+    
+    @staticmethod
+    def loads(data):
+        return orjson.loads(data)
+
+
+# Новые токены подписываются SHA-256, старые (SHA-1) продолжают приниматься
+serializer = URLSafeTimedSerializer(
+    SECRET_KEY,
+    serializer=OrjsonSerializer,
+    signer_kwargs={"digest_method": hashlib.sha256},
+    fallback_signers=[{"digest_method": hashlib.sha1}]
+)
+SESSION_MAX_AGE = 3600 * 24 * 7
+
+# Токен сессии: user_id и срок действия в бинарном виде + усечённый HMAC-SHA256.
+# Проверка — один HMAC без JSON и base64-разбора полей, cookie ~38 символов.
+SESSION_TOKEN_PAYLOAD = struct.Struct("<QI")
+SESSION_TOKEN_SIG_SIZE = 16
+SESSION_TOKEN_SIZE = SESSION_TOKEN_PAYLOAD.size + SESSION_TOKEN_SIG_SIZE
+SESSION_SIGNING_KEY = hashlib.sha256(b"session-token:" + SECRET_KEY.encode("utf-8")).digest()
+
+
+def _sign_session_payload(payload: bytes) -> bytes:
+    return hmac.new(SESSION_SIGNING_KEY, payload, hashlib.sha256).digest()[:SESSION_TOKEN_SIG_SIZE]
 
-SECRET_KEY = os.getenv("SECRET_KEY", secrets.token_hex(32))
-serializer = URLSafeTimedSerializer(SECRET_KEY)
+
+def make_session_token(user_id: int) -> str:
+    """Создаёт токен сессии, действующий SESSION_MAX_AGE секунд"""
+    payload = SESSION_TOKEN_PAYLOAD.pack(user_id, int(time.time()) + SESSION_MAX_AGE)
+    token = base64.urlsafe_b64encode(payload + _sign_session_payload(payload))
+    return token.rstrip(b"=").decode("ascii")
+
+
+def read_session_token(token: str) -> Optional[int]:
+    """Возвращает user_id из токена сессии или None, если токен неверный или истёк"""
+    if "." in token:
+        # Токены старого формата (itsdangerous) принимаются, пока не истечёт их срок
+        return serializer.loads(token, max_age=SESSION_MAX_AGE)
+    
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+    except (ValueError, binascii.Error):
+        return None
+    if len(raw) != SESSION_TOKEN_SIZE:
+        return None
+    
+    payload, signature = raw[:SESSION_TOKEN_PAYLOAD.size], raw[SESSION_TOKEN_PAYLOAD.size:]
+    if not hmac.compare_digest(signature, _sign_session_payload(payload)):
+        return None
+    
+    user_id, expires_at = SESSION_TOKEN_PAYLOAD.unpack(payload)
+    if expires_at < time.time():
+        return None
+    return user_id
 
 ALLOW_REGISTRATION = os.getenv("ALLOW_REGISTRATION", "true").lower() == "true"
+DEBUG = bool(os.getenv("DEBUG"))
+
+# ===========================
+# CACHE (REDIS)
+# ===========================
+# Кэш включается только если задан REDIS_URL
+REDIS_URL = os.getenv("REDIS_URL")
+redis_client = redis.Redis.from_url(REDIS_URL) if REDIS_URL else None
+
+PAGE_CACHE_TTL = 300
+PUBLIC_PAGE_CACHE_TTL = 3600
+USER_CACHE_TTL = 1800
+# Короткий кэш пользователей в памяти процесса — поверх Redis
+LOCAL_USER_CACHE_TTL = 5
+LOCAL_USER_CACHE_MAX = 10_000
+
+
+# Параметры, с которыми приложение само редиректит на страницы.
+# С любыми другими параметрами страница не кэшируется, чтобы нельзя было
+# забить Redis запросами вида /login?<случайная строка>
+CACHEABLE_QUERY_PARAMS = frozenset({
+    ("success", "password_reset"),
+    ("success", "updated"),
+    ("success", "added"),
+    ("error", "file_too_large"),
+    ("error", "upload_failed"),
+})
+
+
+def user_pages_key(user_id: int) -> str:
+    return f"jh:pages:{user_id}"
+
+
+def page_cache_key(request: Request, lang: str, user_id="anon") -> Optional[str]:
+    """Ключ кэша страницы или None, если страницу с такими параметрами не кэшируем"""
+    params = sorted(request.query_params.multi_items())
+    if any(param not in CACHEABLE_QUERY_PARAMS for param in params):
+        return None
+    query = "&".join(f"{name}={value}" for name, value in params)
+    return f"jh:page:{user_id}:{lang}:{request.url.path}?{query}"
+
+
+def get_cached_page(cache_key: Optional[str]) -> Optional[HTMLResponse]:
+    """Возвращает готовый HTML из Redis, если он есть"""
+    if redis_client is None or cache_key is None:
+        return None
+    try:
+        cached = redis_client.get(cache_key)
+    except redis.RedisError as e:
+        print(f"❌ Redis error: {e}")
+        return None
+    if cached is None:
+        return None
+    return HTMLResponse(content=cached)
+
+
+def cache_page(cache_key: Optional[str], response, ttl: int = PAGE_CACHE_TTL, user_id: Optional[int] = None):
+    """Кладёт отрендеренную страницу в Redis и возвращает её же.
+    
+    Ключи страниц пользователя запоминаются в его множестве, чтобы сбрасывать их без SCAN.
+    """
+    if redis_client is None or cache_key is None:
+        return response
+    try:
+        pipe = redis_client.pipeline()
+        pipe.setex(cache_key, ttl, response.body)
+        if user_id is not None:
+            pages_key = user_pages_key(user_id)
+            pipe.sadd(pages_key, cache_key)
+            pipe.expire(pages_key, ttl)
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"❌ Redis error: {e}")
+    return response
+
+
+def invalidate_user_pages(user_id: int):
+    """Сбрасывает все закэшированные страницы пользователя"""
+    if redis_client is None:
+        return
+    pages_key = user_pages_key(user_id)
+    try:
+        keys = redis_client.smembers(pages_key)
+        redis_client.delete(pages_key, *keys)
+    except redis.RedisError as e:
+        print(f"❌ Redis error: {e}")
+
+
+# Поля пользователя, которые храним в кэше (хэш пароля туда не попадает)
+USER_CACHE_FIELDS = ("id", "username", "full_name", "is_admin", "school", "subject", "category", "experience")
+
+
+def user_cache_key(user_id: int) -> str:
+    return f"jh:user:{user_id}"
+
+
+# LRU: обращаются к нему потоки пула, поэтому все операции под блокировкой
+_local_users = OrderedDict()
+_local_users_lock = threading.Lock()
+
+
+def _load_user_data(user_id: int) -> Optional[dict]:
+    with _local_users_lock:
+        entry = _local_users.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            _local_users.move_to_end(user_id)
+            return entry[1]
+    if redis_client is None:
+        return None
+    try:
+        cached = redis_client.get(user_cache_key(user_id))
+    except redis.RedisError as e:
+        print(f"❌ Redis error: {e}")
+        return None
+    if cached is None:
+        return None
+    
+    data = orjson.loads(cached)
+    _remember_user_data(user_id, data)
+    return data
+
+
+def _remember_user_data(user_id: int, data: dict):
+    with _local_users_lock:
+        _local_users[user_id] = (time.monotonic() + LOCAL_USER_CACHE_TTL, data)
+        _local_users.move_to_end(user_id)
+        if len(_local_users) > LOCAL_USER_CACHE_MAX:
+            _local_users.popitem(last=False)
+
+
+def get_cached_user(db: Session, user_id: int) -> Optional[User]:
+    """Достаёт пользователя из кэша (память процесса, затем Redis) и привязывает его к сессии без SELECT"""
+    data = _load_user_data(user_id)
+    if data is None:
+        return None
+    
+    user = User(**data)
+    make_transient_to_detached(user)
+    return db.merge(user, load=False)
+
+
+def cache_user(user: User):
+    data = {field: getattr(user, field) for field in USER_CACHE_FIELDS}
+    _remember_user_data(user.id, data)
+    if redis_client is None:
+        return
+    try:
+        redis_client.setex(user_cache_key(user.id), USER_CACHE_TTL, orjson.dumps(data))
+    except redis.RedisError as e:
+        print(f"❌ Redis error: {e}")
+
+
+def invalidate_user(user_id: int):
+    """Сбрасывает кэш пользователя и его страниц.
+    
+    Другие воркеры могут отдавать старые данные ещё до LOCAL_USER_CACHE_TTL секунд.
+    """
+    with _local_users_lock:
+        _local_users.pop(user_id, None)
+    if redis_client is not None:
+        try:
+            redis_client.delete(user_cache_key(user_id))
+        except redis.RedisError as e:
+            print(f"❌ Redis error: {e}")
+    invalidate_user_pages(user_id)
+
 
 # ===========================
 # TRANSLATIONS
@@ -283,6 +743,7 @@ TRANSLATIONS = {
         "error_passwords_dont_match": "Пароли не совпадают",
         "error_short_username": "Логин должен быть не менее 3 символов",
         "error_short_password": "Пароль должен быть не менее 6 символов",
+        "error_long_password": "Пароль слишком длинный",
         "error_file_too_large": "Файл слишком большой (макс. 5 МБ)",
         "success_achievement_added": "Достижение успешно добавлено",
         "success_user_created": "Пользователь создан",
@@ -456,6 +917,7 @@ TRANSLATIONS = {
         "error_passwords_dont_match": "Құпия сөздер сәйкес емес",
         "error_short_username": "Логин кемінде 3 таңбадан тұруы керек",
         "error_short_password": "Құпия сөз кемінде 6 таңбадан тұруы керек",
+        "error_long_password": "Құпия сөз тым ұзын",
         "error_file_too_large": "Файл тым үлкен (макс. 5 МБ)",
         "success_achievement_added": "Жетістік сәтті қосылды",
         "success_user_created": "Қолданушы жасалды",
@@ -463,8 +925,29 @@ TRANSLATIONS = {
 }
 
 
-def get_translation(lang: str, key: str) -> str:
-    return TRANSLATIONS.get(lang, TRANSLATIONS["ru"]).get(key, key)
+class _Translation(dict):
+    """Словарь переводов: для неизвестного ключа возвращает сам ключ"""
+    def __missing__(self, key):
+        return key
+
+
+# Если ключа нет в выбранном языке, берётся казахский перевод
+FALLBACK_LANGUAGE = "kk"
+
+# Готовые функции перевода для каждого языка (собираются один раз при импорте).
+# Запасной язык подмешивается заранее, поэтому поиск остаётся одним обращением к словарю
+TRANSLATORS = {
+    lang: _Translation({**TRANSLATIONS[FALLBACK_LANGUAGE], **keys}).__getitem__
+    for lang, keys in TRANSLATIONS.items()
+}
+
+
+LANGUAGES = frozenset(TRANSLATORS)
+DEFAULT_LANGUAGE = "ru"
+
+
+def get_translator(lang: str):
+    return TRANSLATORS.get(lang, TRANSLATORS[DEFAULT_LANGUAGE])
 
 
 # ===========================
@@ -479,25 +962,87 @@ def get_db():
 
 
 def get_language(request: Request):
-    return request.cookies.get("language", "ru")
+    # Неизвестный язык из cookie не должен порождать отдельные ключи кэша страниц
+    lang = request.cookies.get("language")
+    return lang if lang in LANGUAGES else DEFAULT_LANGUAGE
 
 
-def get_current_user(session_token: Optional[str] = Cookie(None), db: Session = Depends(get_db)):
+def get_current_user(
+    request: Request,
+    session_token: Optional[str] = Cookie(None),
+    db: Session = Depends(get_db)
+):
+    # Пользователь уже определён в рамках этого запроса
+    if hasattr(request.state, "user"):
+        return request.state.user
+    request.state.user = None
     if not session_token:
         return None
     try:
-        user_id = serializer.loads(session_token, max_age=3600 * 24 * 7)
-        return db.query(User).filter(User.id == user_id).first()
+        user_id = read_session_token(session_token)
+        if user_id is None:
+            return None
+        
+        user = get_cached_user(db, user_id)
+        if user is None:
+            # В режиме отладки любая ленивая загрузка связей вызывает ошибку (поиск N+1)
+            options = [raiseload("*")] if DEBUG else None
+            user = db.get(User, user_id, options=options)
+            if user:
+                cache_user(user)
+        request.state.user = user
+        return user
     except:
         return None
 
 
+class RedirectRequired(Exception):
+    """Прерывает обработку запроса и отправляет пользователя на другую страницу"""
+    def __init__(self, url: str):
+        self.url = url
+
+
+@app.exception_handler(RedirectRequired)
+def redirect_required_handler(request: Request, exc: RedirectRequired):
+    return RedirectResponse(url=exc.url, status_code=303)
+
+
+def require_user(user: Optional[User] = Depends(get_current_user)) -> User:
+    if not user:
+        raise RedirectRequired("/login")
+    return user
+
+
+def require_admin(user: User = Depends(require_user)) -> User:
+    if not user.is_admin:
+        raise RedirectRequired("/home")
+    return user
+
+
+def page_context(
+    request: Request,
+    user: User = Depends(require_user),
+    lang: str = Depends(get_language)
+) -> dict:
+    """Общий контекст шаблона для страниц, доступных после входа"""
+    return {"request": request, "user": user, "lang": lang, "t": get_translator(lang)}
+
+
+def admin_page_context(
+    request: Request,
+    user: User = Depends(require_admin),
+    lang: str = Depends(get_language)
+) -> dict:
+    """Общий контекст шаблона для страниц администратора"""
+    return {"request": request, "user": user, "lang": lang, "t": get_translator(lang)}
+
+
 # ===========================
 # ROUTES - AUTH
 # ===========================
 @app.get("/", response_class=HTMLResponse)
 def root():
-    return RedirectResponse(url="/login")
+    return RedirectResponse(url="/login", status_code=303)
 
 
 @app.get("/set-language/{lang}")
@@ -511,18 +1056,25 @@ def set_language(request: Request, lang: str):
         path = "/home"
     
     response = RedirectResponse(url=path, status_code=303)
-    response.set_cookie(key="language", value=lang, max_age=3600 * 24 * 365)
+    if lang in LANGUAGES:
+        response.set_cookie(key="language", value=lang, max_age=3600 * 24 * 365)
     return response
 
 
 @app.get("/login", response_class=HTMLResponse)
 def login_page(request: Request, lang: str = Depends(get_language)):
-    t = lambda key: get_translation(lang, key)
-    return templates.TemplateResponse("login.html", {"request": request, "lang": lang, "t": t})
+    cache_key = page_cache_key(request, lang)
+    cached = get_cached_page(cache_key)
+    if cached:
+        return cached
+    
+    t = get_translator(lang)
+    response = templates.TemplateResponse("login.html", {"request": request, "lang": lang, "t": t})
+    return cache_page(cache_key, response, ttl=PUBLIC_PAGE_CACHE_TTL)
 @app.get("/forgot-password", response_class=HTMLResponse)
 def forgot_password_page(request: Request, lang: str = Depends(get_language)):
     """Страница запроса восстановления пароля"""
-    t = lambda key: get_translation(lang, key)
+    t = get_translator(lang)
     return templates.TemplateResponse("forgot_password.html", {
         "request": request,
         "lang": lang,
@@ -537,7 +1089,7 @@ def forgot_password_post(
     lang: str = Depends(get_language)
 ):
     """Обработка запроса восстановления пароля"""
-    t = lambda key: get_translation(lang, key)
+    t = get_translator(lang)
     
     # Найти пользователя
     user = db.query(User).filter(User.username == username).first()
@@ -573,7 +1125,7 @@ def reset_password_page(
     lang: str = Depends(get_language)
 ):
     """Страница установки нового пароля"""
-    t = lambda key: get_translation(lang, key)
+    t = get_translator(lang)
     
     try:
         # Проверить токен (действителен 1 час)
@@ -604,7 +1156,7 @@ def reset_password_post(
     lang: str = Depends(get_language)
 ):
     """Обработка установки нового пароля"""
-    t = lambda key: get_translation(lang, key)
+    t = get_translator(lang)
     
     try:
         # Проверить токен
@@ -623,6 +1175,8 @@ def reset_password_post(
     error = None
     if len(new_password) < 6:
         error = t("error_short_password")
+    elif len(new_password) > MAX_PASSWORD_LENGTH:
+        error = t("error_long_password")
     elif new_password != confirm_password:
         error = t("error_passwords_dont_match")
     
@@ -636,7 +1190,7 @@ def reset_password_post(
         })
     
     # Найти пользователя и обновить пароль
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.get(User, user_id)
     if not user:
         return templates.TemplateResponse("reset_password.html", {
             "request": {},
@@ -649,6 +1203,7 @@ def reset_password_post(
     # Обновить пароль
     user.password_hash = hash_password(new_password)
     db.commit()
+    invalidate_user(user.id)
     
     # Перенаправить на страницу входа с сообщением
     return RedirectResponse(url="/login?success=password_reset", status_code=303)
@@ -660,10 +1215,18 @@ def login_post(
     db: Session = Depends(get_db),
     lang: str = Depends(get_language)
 ):
-    t = lambda key: get_translation(lang, key)
+    t = get_translator(lang)
     user = db.query(User).filter(User.username == username).first()
     
-    if not user or not user.check_password(password):
+    # Обработчик синхронный, поэтому FastAPI выполняет его (и хэширование) в пуле потоков
+    if len(password) > MAX_PASSWORD_LENGTH:
+        password_ok = False
+    elif user:
+        password_ok = user.check_password(password)
+    else:
+        password_ok = dummy_check_password(password)
+    
+    if not password_ok:
         return templates.TemplateResponse("login.html", {
             "request": {},
             "error": t("error_invalid_credentials"),
@@ -671,18 +1234,29 @@ def login_post(
             "t": t
         })
     
-    token = serializer.dumps(user.id)
+    # Перевести старый bcrypt-хэш на argon2
+    if user.password_needs_rehash():
+        user.password_hash = hash_password(password)
+        db.commit()
+    
+    token = make_session_token(user.id)
     response = RedirectResponse(url="/home", status_code=303)
-    response.set_cookie(key="session_token", value=token, httponly=True, max_age=3600 * 24 * 7)
+    response.set_cookie(key="session_token", value=token, httponly=True, max_age=SESSION_MAX_AGE)
     return response
 
 
 @app.get("/register", response_class=HTMLResponse)
 def register_page(request: Request, lang: str = Depends(get_language)):
     if not ALLOW_REGISTRATION:
-        return RedirectResponse(url="/login")
-    t = lambda key: get_translation(lang, key)
-    return templates.TemplateResponse("register.html", {"request": request, "lang": lang, "t": t})
+        return RedirectResponse(url="/login", status_code=303)
+    cache_key = page_cache_key(request, lang)
+    cached = get_cached_page(cache_key)
+    if cached:
+        return cached
+    
+    t = get_translator(lang)
+    response = templates.TemplateResponse("register.html", {"request": request, "lang": lang, "t": t})
+    return cache_page(cache_key, response, ttl=PUBLIC_PAGE_CACHE_TTL)
 
 
 @app.post("/register")
@@ -698,16 +1272,18 @@ def register_post(
     db: Session = Depends(get_db),
     lang: str = Depends(get_language)
 ):
-    t = lambda key: get_translation(lang, key)
+    t = get_translator(lang)
     
     if not ALLOW_REGISTRATION:
-        return RedirectResponse(url="/login")
+        return RedirectResponse(url="/login", status_code=303)
     
     error = None
     if len(username) < 3:
         error = t("error_short_username")
     elif len(password) < 6:
         error = t("error_short_password")
+    elif len(password) > MAX_PASSWORD_LENGTH:
+        error = t("error_long_password")
     elif password != confirm_password:
         error = t("error_passwords_dont_match")
     elif db.query(User).filter(User.username == username).first():
@@ -735,15 +1311,15 @@ def register_post(
     db.add(new_user)
     db.commit()
     
-    token = serializer.dumps(new_user.id)
+    token = make_session_token(new_user.id)
     response = RedirectResponse(url="/home", status_code=303)
-    response.set_cookie(key="session_token", value=token, httponly=True, max_age=3600 * 24 * 7)
+    response.set_cookie(key="session_token", value=token, httponly=True, max_age=SESSION_MAX_AGE)
     return response
 
 
 @app.get("/logout")
 def logout():
-    response = RedirectResponse(url="/login")
+    response = RedirectResponse(url="/login", status_code=303)
     response.delete_cookie("session_token")
     return response
 
@@ -752,187 +1328,112 @@ def logout():
 # ROUTES - MAIN PAGES
 # ===========================
 @app.get("/home", response_class=HTMLResponse)
-def home_page(
-    request: Request,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    lang: str = Depends(get_language)
-):
-    if not user:
-        return RedirectResponse(url="/login")
-    
-    t = lambda key: get_translation(lang, key)
-    return templates.TemplateResponse("home.html", {
-        "request": request,
-        "user": user,
-        "lang": lang,
-        "t": t
-    })
+def home_page(ctx: dict = Depends(page_context)):
+    return templates.TemplateResponse("home.html", ctx)
 
 
 @app.get("/jeke-cabinet", response_class=HTMLResponse)
-def jeke_cabinet(
-    request: Request,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    lang: str = Depends(get_language)
-):
-    if not user:
-        return RedirectResponse(url="/login")
-    
-    t = lambda key: get_translation(lang, key)
-    achievements = db.query(Achievement).filter(Achievement.user_id == user.id).all()
+def jeke_cabinet(ctx: dict = Depends(page_context), db: Session = Depends(get_db)):
+    achievements = db.query(Achievement).filter(
+        Achievement.user_id == ctx["user"].id,
+        Achievement.status != ACHIEVEMENT_UPLOADING
+    ).all()
     
     total_points = sum(a.points for a in achievements if a.status == "approved")
     pending_count = sum(1 for a in achievements if a.status == "pending")
     approved_count = sum(1 for a in achievements if a.status == "approved")
     
     return templates.TemplateResponse("jeke_cabinet.html", {
-        "request": request,
-        "user": user,
+        **ctx,
         "achievements": achievements,
         "total_points": total_points,
         "pending_count": pending_count,
-        "approved_count": approved_count,
-        "lang": lang,
-        "t": t
+        "approved_count": approved_count
     })
 
 
 @app.get("/jetistik-alany", response_class=HTMLResponse)
-def jetistik_alany(
-    request: Request,
-    user: User = Depends(get_current_user),
-    lang: str = Depends(get_language)
-):
-    if not user:
-        return RedirectResponse(url="/login")
+def jetistik_alany(ctx: dict = Depends(page_context)):
+    cache_key = page_cache_key(ctx["request"], ctx["lang"], ctx["user"].id)
+    cached = get_cached_page(cache_key)
+    if cached:
+        return cached
     
-    t = lambda key: get_translation(lang, key)
-    return templates.TemplateResponse("jetistik_alany.html", {
-        "request": request,
-        "user": user,
-        "lang": lang,
-        "t": t
-    })
+    response = templates.TemplateResponse("jetistik_alany.html", ctx)
+    return cache_page(cache_key, response, user_id=ctx["user"].id)
 
 
 @app.get("/oqushy-status", response_class=HTMLResponse)
-def oqushy_status(
-    request: Request,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    lang: str = Depends(get_language)
-):
-    if not user:
-        return RedirectResponse(url="/login")
+def oqushy_status(ctx: dict = Depends(page_context), db: Session = Depends(get_db)):
+    cache_key = page_cache_key(ctx["request"], ctx["lang"], ctx["user"].id)
+    cached = get_cached_page(cache_key)
+    if cached:
+        return cached
     
-    t = lambda key: get_translation(lang, key)
     achievements = db.query(Achievement).filter(
-        Achievement.user_id == user.id,
-        Achievement.achievement_type == "oqushy_status"
+        Achievement.user_id == ctx["user"].id,
+        Achievement.achievement_type == "oqushy_status",
+        Achievement.status != ACHIEVEMENT_UPLOADING
     ).all()
     
-    return templates.TemplateResponse("oqushy_status.html", {
-        "request": request,
-        "user": user,
-        "achievements": achievements,
-        "lang": lang,
-        "t": t
-    })
+    response = templates.TemplateResponse("oqushy_status.html", {**ctx, "achievements": achievements})
+    return cache_page(cache_key, response, user_id=ctx["user"].id)
 
 
 @app.get("/sapa-qorzhyn", response_class=HTMLResponse)
-def sapa_qorzhyn(
-    request: Request,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    lang: str = Depends(get_language)
-):
-    if not user:
-        return RedirectResponse(url="/login")
+def sapa_qorzhyn(ctx: dict = Depends(page_context), db: Session = Depends(get_db)):
+    cache_key = page_cache_key(ctx["request"], ctx["lang"], ctx["user"].id)
+    cached = get_cached_page(cache_key)
+    if cached:
+        return cached
     
-    t = lambda key: get_translation(lang, key)
     achievements = db.query(Achievement).filter(
-        Achievement.user_id == user.id,
-        Achievement.achievement_type == "sapa_qorzhyn"
+        Achievement.user_id == ctx["user"].id,
+        Achievement.achievement_type == "sapa_qorzhyn",
+        Achievement.status != ACHIEVEMENT_UPLOADING
     ).all()
     
-    return templates.TemplateResponse("sapa_qorzhyn.html", {
-        "request": request,
-        "user": user,
-        "achievements": achievements,
-        "lang": lang,
-        "t": t
-    })
+    response = templates.TemplateResponse("sapa_qorzhyn.html", {**ctx, "achievements": achievements})
+    return cache_page(cache_key, response, user_id=ctx["user"].id)
 
 
 @app.get("/qogam-serpin", response_class=HTMLResponse)
-def qogam_serpin(
-    request: Request,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    lang: str = Depends(get_language)
-):
-    if not user:
-        return RedirectResponse(url="/login")
+def qogam_serpin(ctx: dict = Depends(page_context), db: Session = Depends(get_db)):
+    cache_key = page_cache_key(ctx["request"], ctx["lang"], ctx["user"].id)
+    cached = get_cached_page(cache_key)
+    if cached:
+        return cached
     
-    t = lambda key: get_translation(lang, key)
     achievements = db.query(Achievement).filter(
-        Achievement.user_id == user.id,
-        Achievement.achievement_type == "qogam_serpin"
+        Achievement.user_id == ctx["user"].id,
+        Achievement.achievement_type == "qogam_serpin",
+        Achievement.status != ACHIEVEMENT_UPLOADING
     ).all()
     
-    return templates.TemplateResponse("qogam_serpin.html", {
-        "request": request,
-        "user": user,
-        "achievements": achievements,
-        "lang": lang,
-        "t": t
-    })
+    response = templates.TemplateResponse("qogam_serpin.html", {**ctx, "achievements": achievements})
+    return cache_page(cache_key, response, user_id=ctx["user"].id)
 
 
 @app.get("/tarbie-arnasy", response_class=HTMLResponse)
-def tarbie_arnasy(
-    request: Request,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    lang: str = Depends(get_language)
-):
-    if not user:
-        return RedirectResponse(url="/login")
+def tarbie_arnasy(ctx: dict = Depends(page_context), db: Session = Depends(get_db)):
+    cache_key = page_cache_key(ctx["request"], ctx["lang"], ctx["user"].id)
+    cached = get_cached_page(cache_key)
+    if cached:
+        return cached
     
-    t = lambda key: get_translation(lang, key)
     achievements = db.query(Achievement).filter(
-        Achievement.user_id == user.id,
-        Achievement.achievement_type == "tarbie_arnasy"
+        Achievement.user_id == ctx["user"].id,
+        Achievement.achievement_type == "tarbie_arnasy",
+        Achievement.status != ACHIEVEMENT_UPLOADING
     ).all()
     
-    return templates.TemplateResponse("tarbie_arnasy.html", {
-        "request": request,
-        "user": user,
-        "achievements": achievements,
-        "lang": lang,
-        "t": t
-    })
+    response = templates.TemplateResponse("tarbie_arnasy.html", {**ctx, "achievements": achievements})
+    return cache_page(cache_key, response, user_id=ctx["user"].id)
 
 
 @app.get("/edit-profile", response_class=HTMLResponse)
-def edit_profile_page(
-    request: Request,
-    user: User = Depends(get_current_user),
-    lang: str = Depends(get_language)
-):
-    if not user:
-        return RedirectResponse(url="/login", status_code=303)
-    
-    t = lambda key: get_translation(lang, key)
-    return templates.TemplateResponse("edit_profile.html", {
-        "request": request,
-        "user": user,
-        "lang": lang,
-        "t": t
-    })
+def edit_profile_page(ctx: dict = Depends(page_context)):
+    return templates.TemplateResponse("edit_profile.html", ctx)
 
 
 @app.post("/update-profile")
@@ -958,111 +1459,208 @@ def update_profile(
     user.experience = experience
     
     db.commit()
+    invalidate_user(user.id)
     
     return RedirectResponse(url="/edit-profile?success=updated", status_code=303)
 
 
 @app.get("/admin", response_class=HTMLResponse)
-def admin_panel(
-    request: Request,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    lang: str = Depends(get_language)
-):
-    if not user or not user.is_admin:
-        return RedirectResponse(url="/home")
-    
-    t = lambda key: get_translation(lang, key)
-    all_users = db.query(User).all()
-    pending_achievements = db.query(Achievement).filter(Achievement.status == "pending").all()
-    
-    # Рассчитать баллы для каждого пользователя и отсортировать
-    user_data = []
-    for u in all_users:
-        total_points = sum(ach.points for ach in u.achievements if ach.status == 'approved')
-        user_data.append({
-            'user': u,
-            'points': total_points
-        })
+def admin_panel(ctx: dict = Depends(admin_page_context), db: Session = Depends(get_db)):
+    # Баллы за подтверждённые достижения считает БД, без загрузки самих достижений
+    approved_points = func.sum(case((Achievement.status == "approved", Achievement.points), else_=0))
+    rows = db.query(User, approved_points).outerjoin(
+        Achievement, Achievement.user_id == User.id
+    ).group_by(User.id).order_by(approved_points.desc(), User.id).all()
     
     # Сортировка по баллам (от большего к меньшему)
-    user_data.sort(key=lambda x: x['points'], reverse=True)
+    user_data = [{'user': u, 'points': points or 0} for u, points in rows]
+    
+    pending_count = db.query(func.count(Achievement.id)).filter(Achievement.status == "pending").scalar()
     
     return templates.TemplateResponse("admin.html", {
-        "request": request,
-        "user": user,
+        **ctx,
         "user_data": user_data,  # Передаём отсортированные данные
-        "pending_achievements": pending_achievements,
-        "lang": lang,
-        "t": t
+        "pending_count": pending_count
     })
 
 
+MODERATE_PAGE_SIZE = 50
+MODERATE_MAX_PAGE = 100_000
+
+
 @app.get("/moderate", response_class=HTMLResponse)
 def moderate_page(
-    request: Request,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    lang: str = Depends(get_language)
+    page: int = Query(0, ge=0, le=MODERATE_MAX_PAGE),
+    ctx: dict = Depends(admin_page_context),
+    db: Session = Depends(get_db)
 ):
-    if not user or not user.is_admin:
-        return RedirectResponse(url="/home")
-    
-    # Получить все достижения со статусом pending
-    pending_achievements = db.query(Achievement).filter(
-        Achievement.status == "pending"
-    ).order_by(Achievement.created_at.desc()).all()
-    
-    # Получить одобренные
-    approved_achievements = db.query(Achievement).filter(
-        Achievement.status == "approved"
-    ).order_by(Achievement.created_at.desc()).all()
-    
-    # Получить отклонённые
-    rejected_achievements = db.query(Achievement).filter(
-        Achievement.status == "rejected"
-    ).order_by(Achievement.created_at.desc()).all()
-    
-    t = lambda key: get_translation(lang, key)
+    def achievements_page(status: str):
+        return db.query(Achievement).options(selectinload(Achievement.user)).filter(
+            Achievement.status == status
+        ).order_by(Achievement.created_at.desc()).limit(MODERATE_PAGE_SIZE).offset(page * MODERATE_PAGE_SIZE).all()
+    
+    # Получить по одной странице ожидающих, одобренных и отклонённых
+    pending_achievements = achievements_page("pending")
+    approved_achievements = achievements_page("approved")
+    rejected_achievements = achievements_page("rejected")
+    
+    # Количество по статусам одним запросом
+    counts = dict(
+        db.query(Achievement.status, func.count(Achievement.id)).group_by(Achievement.status).all()
+    )
+    pending_count = counts.get("pending", 0)
+    approved_count = counts.get("approved", 0)
+    rejected_count = counts.get("rejected", 0)
+    has_next = max(pending_count, approved_count, rejected_count) > (page + 1) * MODERATE_PAGE_SIZE
     
     return templates.TemplateResponse("moderate.html", {
-        "request": request,
-        "user": user,
+        **ctx,
         "pending_achievements": pending_achievements,
         "approved_achievements": approved_achievements,
         "rejected_achievements": rejected_achievements,
-        "pending_count": len(pending_achievements),
-        "approved_count": len(approved_achievements),
-        "rejected_count": len(rejected_achievements),
-        "lang": lang,
-        "t": t
+        "pending_count": pending_count,
+        "approved_count": approved_count,
+        "rejected_count": rejected_count,
+        "page": page,
+        "has_next": has_next
     })
 
 
 @app.get("/reports", response_class=HTMLResponse)
-def reports_page(
-    request: Request,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-    lang: str = Depends(get_language)
-):
-    if not user:
-        return RedirectResponse(url="/login")
-    
+def reports_page(ctx: dict = Depends(admin_page_context), db: Session = Depends(get_db)):
     # Только админ может видеть отчеты
-    if not user.is_admin:
-        return RedirectResponse(url="/home")
+    all_users = db.query(User).options(selectinload(User.achievements)).all()
     
-    t = lambda key: get_translation(lang, key)
-    all_users = db.query(User).all()
+    return templates.TemplateResponse("reports.html", {**ctx, "all_users": all_users})
+
+
+# ===========================
+# ACHIEVEMENT HELPERS
+# ===========================
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # Увеличил лимит до 10 MB
+UPLOAD_CONCURRENCY = 6  # Сколько файлов одновременно грузим в Cloudinary
+
+
+# Баллы для Oqushy Status и Sapa Qorzhyn: (уровень, место) -> баллы
+POINTS_TABLE: dict[tuple[str, str], int] = {
+    ('city', '1'): 35, ('city', '2'): 30, ('city', '3'): 25, ('city', 'certificate'): 10,
+    ('regional', '1'): 40, ('regional', '2'): 35, ('regional', '3'): 30, ('regional', 'certificate'): 15,
+    ('national', '1'): 45, ('national', '2'): 40, ('national', '3'): 35, ('national', 'certificate'): 20,
+    ('international', '1'): 50, ('international', '2'): 45, ('international', '3'): 40, ('international', 'certificate'): 25
+}
+
+# Руководитель МО и классное руководство - по стажу
+YEARS_POINTS = {
+    '0_1': 10,
+    '1_2': 15,
+    '2_3': 20,
+    '3_plus': 25
+}
+
+# Общественные мероприятия - по уровню
+SOCIAL_EVENTS_POINTS = {
+    'city': 10,
+    'regional': 15,
+    'national': 20
+}
+
+# Волонтерство - по уровню
+VOLUNTEERING_POINTS = {
+    'city': 25,
+    'regional': 30,
+    'national': 35
+}
+
+# Голос родителей - по % участия
+PARTICIPATION_POINTS = {
+    'up_to_40': 10,
+    'up_to_70': 20,
+    'up_to_90': 30
+}
+
+
+def calculate_points(
+    achievement_type: str,
+    category: str,
+    level: Optional[str] = None,
+    place: Optional[str] = None,
+    years_experience: Optional[str] = None,
+    parent_participation: Optional[str] = None
+) -> int:
+    """Расчёт баллов за достижение"""
+    # Для Oqushy Status и Sapa Qorzhyn - расчет по уровню и месту
+    if achievement_type in ('oqushy_status', 'sapa_qorzhyn'):
+        if level and place:
+            return POINTS_TABLE.get((level, place), 0)
     
-    return templates.TemplateResponse("reports.html", {
-        "request": request,
-        "user": user,
-        "all_users": all_users,
-        "lang": lang,
-        "t": t
-    })
+    # Для Qogam Serpin
+    elif achievement_type == 'qogam_serpin':
+        if category == 'methodical_leader' and years_experience:
+            return YEARS_POINTS.get(years_experience, 0)
+        elif category == 'social_events' and level:
+            return SOCIAL_EVENTS_POINTS.get(level, 0)
+        elif category == 'volunteering' and level:
+            return VOLUNTEERING_POINTS.get(level, 0)
+    
+    # Для Tarbie Arnasy
+    elif achievement_type == 'tarbie_arnasy':
+        if category == 'class_management' and years_experience:
+            return YEARS_POINTS.get(years_experience, 0)
+        elif category == 'parent_voice' and parent_participation:
+            return PARTICIPATION_POINTS.get(parent_participation, 0)
+        elif category == 'specialist_cooperation':
+            # Сотрудничество со специалистами - фиксированно
+            return 10
+    
+    return 0
+
+
+def get_upload_size(file: UploadFile) -> int:
+    """Размер файла без чтения его в память"""
+    file.file.seek(0, 2)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+
+async def upload_to_cloudinary(file: UploadFile) -> dict:
+    """Загружает файл в Cloudinary и возвращает ответ (secure_url, public_id, resource_type)"""
+    file_ext = file.filename.rpartition(".")[2].lower()
+    
+    # ДОБАВИТЬ РАСШИРЕНИЕ В PUBLIC_ID!
+    public_id = f"jetistik_hub/{uuid.uuid4().hex}.{file_ext}"  # ← С РАСШИРЕНИЕМ!
+    
+    # Определить тип файла
+    if file_ext == 'pdf':
+        resource_type = "raw"  # PDF загружается как raw
+    else:
+        resource_type = "image"  # Картинки как image
+    
+    # Отправляем файл частями прямо из временного файла Starlette.
+    # Загрузка блокирующая, поэтому выполняется в отдельном потоке
+    upload_result = await asyncio.to_thread(
+        cloudinary.uploader.upload_large,
+        file.file,
+        public_id=public_id,
+        resource_type=resource_type,
+        chunk_size=6_000_000
+    )
+    
+    print(f"✅ File uploaded to Cloudinary: {upload_result['secure_url']} (type: {resource_type})")
+    return upload_result
+
+
+async def delete_from_cloudinary(upload_result: dict):
+    """Удаляет загруженный файл, если достижение так и не было сохранено"""
+    try:
+        await asyncio.to_thread(
+            cloudinary.uploader.destroy,
+            upload_result["public_id"],
+            resource_type=upload_result["resource_type"],
+            invalidate=True
+        )
+    except Exception as e:
+        print(f"❌ Cloudinary delete error: {e}")
 
 
 # ===========================
@@ -1085,114 +1683,12 @@ async def add_achievement(
     lang: str = Depends(get_language)
 ):
     if not user:
-        return RedirectResponse(url="/login")
+        return RedirectResponse(url="/login", status_code=303)
     
     # Расчёт баллов
-    calculated_points = 0
-    
-    # Для Oqushy Status и Sapa Qorzhyn - расчет по уровню и месту
-    if achievement_type in ['oqushy_status', 'sapa_qorzhyn'] and level and place:
-        points_table = {
-            'city': {'1': 35, '2': 30, '3': 25, 'certificate': 10},
-            'regional': {'1': 40, '2': 35, '3': 30, 'certificate': 15},
-            'national': {'1': 45, '2': 40, '3': 35, 'certificate': 20},
-            'international': {'1': 50, '2': 45, '3': 40, 'certificate': 25}
-        }
-        calculated_points = points_table.get(level, {}).get(place, 0)
-    
-    # Для Qogam Serpin
-    elif achievement_type == 'qogam_serpin':
-        if category == 'methodical_leader' and years_experience:
-            # Руководитель МО - по стажу
-            years_points = {
-                '0_1': 10,
-                '1_2': 15,
-                '2_3': 20,
-                '3_plus': 25
-            }
-            calculated_points = years_points.get(years_experience, 0)
-        elif category == 'social_events' and level:
-            # Общественные мероприятия - по уровню
-            level_points = {
-                'city': 10,
-                'regional': 15,
-                'national': 20
-            }
-            calculated_points = level_points.get(level, 0)
-        elif category == 'volunteering' and level:
-            # Волонтерство - по уровню
-            level_points = {
-                'city': 25,
-                'regional': 30,
-                'national': 35
-            }
-            calculated_points = level_points.get(level, 0)
-    
-    # Для Tarbie Arnasy
-    elif achievement_type == 'tarbie_arnasy':
-        if category == 'class_management' and years_experience:
-            # Классное руководство - по стажу
-            years_points = {
-                '0_1': 10,
-                '1_2': 15,
-                '2_3': 20,
-                '3_plus': 25
-            }
-            calculated_points = years_points.get(years_experience, 0)
-        elif category == 'parent_voice' and parent_participation:
-            # Голос родителей - по % участия
-            participation_points = {
-                'up_to_40': 10,
-                'up_to_70': 20,
-                'up_to_90': 30
-            }
-            calculated_points = participation_points.get(parent_participation, 0)
-        elif category == 'specialist_cooperation':
-            # Сотрудничество со специалистами - фиксированно
-            calculated_points = 10
-    
-    file_path = None
-    if file and file.filename:
-        content = await file.read()
-        if len(content) > 10 * 1024 * 1024:  # Увеличил лимит до 10 MB
-            t = lambda key: get_translation(lang, key)
-            return RedirectResponse(url=f"/{achievement_type.replace('_', '-')}?error=file_too_large", status_code=303)
-        
-        file_ext = file.filename.split(".")[-1].lower()  # ← ИСПРАВЛЕН ОТСТУП!
-        
-        # Загрузить в Cloudinary
-        try:
-            # ДОБАВИТЬ РАСШИРЕНИЕ В PUBLIC_ID!
-            public_id = f"jetistik_hub/{uuid.uuid4()}.{file_ext}"  # ← С РАСШИРЕНИЕМ!
-            
-            # Определить тип файла
-            if file_ext == 'pdf':
-                resource_type = "raw"  # PDF загружается как raw
-            else:
-                resource_type = "image"  # Картинки как image
-            
-            file_stream = BytesIO(content)  # ← Создать file-like объект
-            file_stream.seek(0)
-            
-            upload_result = cloudinary.uploader.upload(
-                file_stream,
-                public_id=public_id,
-                resource_type=resource_type
-            )
-            
-            file_path = upload_result['secure_url']
-            print(f"✅ File uploaded to Cloudinary: {file_path} (type: {resource_type})")
-            
-        except Exception as e:
-            print(f"❌ Cloudinary upload error: {e}")
-            t = lambda key: get_translation(lang, key)
-            return RedirectResponse(url=f"/{achievement_type.replace('_', '-')}?error=upload_failed", status_code=303)
-            
-            with open(local_path, "wb") as f:
-                f.write(content)
-            
-            file_path = f"/uploads/{unique_filename}"
-            print(f"📁 File saved locally (fallback): {file_path}")
+    calculated_points = calculate_points(
+        achievement_type, category, level, place, years_experience, parent_participation
+    )
     
     new_achievement = Achievement(
         user_id=user.id,
@@ -1203,16 +1699,175 @@ async def add_achievement(
         category=category,
         level=level,
         place=place,
-        file_path=file_path,
+        file_path=None,
         points=calculated_points,
-        status="pending"
+        status=ACHIEVEMENT_UPLOADING if file and file.filename else "pending"
     )
-    db.add(new_achievement)
-    db.commit()
+    
+    # Сессия БД синхронная, поэтому в async-обработчике она работает в отдельном потоке
+    def save_achievement():
+        db.add(new_achievement)
+        db.commit()
+    
+    def attach_file(url: str):
+        # Ссылка и статус меняются одним UPDATE: до этого достижение нигде не видно
+        new_achievement.file_path = url
+        new_achievement.status = "pending"
+        db.commit()
+    
+    def discard_achievement():
+        db.delete(new_achievement)
+        db.commit()
+    
+    if file and file.filename:
+        if get_upload_size(file) > MAX_UPLOAD_SIZE:
+            return RedirectResponse(url=f"/{achievement_type.replace('_', '-')}?error=file_too_large", status_code=303)
+        
+        # Загрузка в Cloudinary и запись в БД (со статусом uploading) идут параллельно,
+        # ссылка на файл дописывается, когда обе операции завершатся
+        uploaded, saved = await asyncio.gather(
+            upload_to_cloudinary(file),
+            asyncio.to_thread(save_achievement),
+            return_exceptions=True
+        )
+        if isinstance(saved, Exception):
+            raise saved
+        
+        if isinstance(uploaded, Exception):
+            print(f"❌ Cloudinary upload error: {uploaded}")
+            await asyncio.to_thread(discard_achievement)
+            return RedirectResponse(url=f"/{achievement_type.replace('_', '-')}?error=upload_failed", status_code=303)
+        
+        await asyncio.to_thread(attach_file, uploaded["secure_url"])
+    else:
+        await asyncio.to_thread(save_achievement)
+    
+    await asyncio.to_thread(invalidate_user_pages, user.id)
     
     return RedirectResponse(url=f"/{achievement_type.replace('_', '-')}?success=added", status_code=303)
 
 
+# Поля metadata пакетной загрузки: все значения - строки, как в форме /add-achievement
+BATCH_REQUIRED_FIELDS = ("achievement_type", "title", "category")
+BATCH_OPTIONAL_FIELDS = ("student_name", "description", "level", "place", "years_experience", "parent_participation")
+
+
+def parse_batch_metadata(metadata: str, file_count: int) -> List[dict]:
+    """Разбирает metadata пакетной загрузки, при неверных данных отвечает 400"""
+    try:
+        items = json.loads(metadata)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid metadata")
+    if not isinstance(items, list) or len(items) != file_count:
+        raise HTTPException(status_code=400, detail="Metadata must match files")
+    
+    for item in items:
+        if not isinstance(item, dict):
+            raise HTTPException(status_code=400, detail="Invalid metadata")
+        if not all(isinstance(item.get(field), str) and item[field] for field in BATCH_REQUIRED_FIELDS):
+            raise HTTPException(status_code=400, detail="Invalid metadata")
+        if not all(isinstance(item[field], str) for field in BATCH_OPTIONAL_FIELDS if item.get(field) is not None):
+            raise HTTPException(status_code=400, detail="Invalid metadata")
+    return items
+
+
+@app.post("/add-achievements/batch")
+async def add_achievements_batch(
+    files: List[UploadFile] = File(...),
+    metadata: str = Form(...),
+    user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Добавление нескольких достижений за один запрос.
+    
+    metadata - JSON-массив объектов с полями формы /add-achievement,
+    по одному на каждый файл (в том же порядке).
+    """
+    if not user:
+        return RedirectResponse(url="/login", status_code=303)
+    
+    items = parse_batch_metadata(metadata, len(files))
+    
+    if any(get_upload_size(f) > MAX_UPLOAD_SIZE for f in files if f.filename):
+        return RedirectResponse(url="/jeke-cabinet?error=file_too_large", status_code=303)
+    
+    # Загружаем файлы параллельно, но не больше UPLOAD_CONCURRENCY одновременно
+    semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+    
+    async def upload(f: UploadFile) -> Optional[dict]:
+        if not f.filename:
+            return None
+        async with semaphore:
+            return await upload_to_cloudinary(f)
+    
+    async def discard_uploads():
+        # Без записи в БД загруженные файлы никому не видны - удаляем их
+        await asyncio.gather(*[
+            delete_from_cloudinary(result) for result in results
+            if result is not None and not isinstance(result, Exception)
+        ])
+    
+    results = await asyncio.gather(*[upload(f) for f in files], return_exceptions=True)
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        print(f"❌ Cloudinary upload error: {errors[0]}")
+        await discard_uploads()
+        return RedirectResponse(url="/jeke-cabinet?error=upload_failed", status_code=303)
+    
+    new_achievements = [
+        Achievement(
+            user_id=user.id,
+            achievement_type=item["achievement_type"],
+            student_name=item.get("student_name"),
+            title=item["title"],
+            description=item.get("description", ""),
+            category=item["category"],
+            level=item.get("level"),
+            place=item.get("place"),
+            file_path=result["secure_url"] if result else None,
+            points=calculate_points(
+                item["achievement_type"],
+                item["category"],
+                item.get("level"),
+                item.get("place"),
+                item.get("years_experience"),
+                item.get("parent_participation")
+            ),
+            status="pending"
+        )
+        for item, result in zip(items, results)
+    ]
+    
+    def save_achievements():
+        db.add_all(new_achievements)
+        db.commit()
+    
+    # Сессия БД синхронная, поэтому в async-обработчике она работает в отдельном потоке
+    try:
+        await asyncio.to_thread(save_achievements)
+    except Exception:
+        await discard_uploads()
+        raise
+    await asyncio.to_thread(invalidate_user_pages, user.id)
+    
+    return RedirectResponse(url="/jeke-cabinet?success=added", status_code=303)
+
+
+def set_achievement_status(db: Session, achievement_id: int, status: str):
+    """Меняет статус одним UPDATE ... RETURNING, без загрузки объекта"""
+    owner_id = db.execute(
+        update(Achievement)
+        .where(Achievement.id == achievement_id, Achievement.status != ACHIEVEMENT_UPLOADING)
+        .values(status=status)
+        .returning(Achievement.user_id)
+        .execution_options(synchronize_session=False)
+    ).scalar_one_or_none()
+    if owner_id is None:
+        raise HTTPException(status_code=404)
+    db.commit()
+    invalidate_user_pages(owner_id)
+
+
 @app.post("/achievement/{achievement_id}/approve")
 def approve_achievement(
     achievement_id: int,
@@ -1222,10 +1877,7 @@ def approve_achievement(
     if not user or not user.is_admin:
         raise HTTPException(status_code=403)
     
-    achievement = db.query(Achievement).filter(Achievement.id == achievement_id).first()
-    if achievement:
-        achievement.status = "approved"
-        db.commit()
+    set_achievement_status(db, achievement_id, "approved")
     return RedirectResponse(url="/admin", status_code=303)
 
 
@@ -1238,10 +1890,7 @@ def reject_achievement(
     if not user or not user.is_admin:
         raise HTTPException(status_code=403)
     
-    achievement = db.query(Achievement).filter(Achievement.id == achievement_id).first()
-    if achievement:
-        achievement.status = "rejected"
-        db.commit()
+    set_achievement_status(db, achievement_id, "rejected")
     return RedirectResponse(url="/admin", status_code=303)
 
 
@@ -1254,10 +1903,11 @@ def delete_achievement(
     if not user:
         raise HTTPException(status_code=403)
     
-    achievement = db.query(Achievement).filter(Achievement.id == achievement_id).first()
+    achievement = db.get(Achievement, achievement_id)
     if achievement and (achievement.user_id == user.id or user.is_admin):
         db.delete(achievement)
         db.commit()
+        invalidate_user_pages(achievement.user_id)
     
     return RedirectResponse(url="/jeke-cabinet", status_code=303)
 
@@ -1275,6 +1925,8 @@ def create_user(
     if not user or not user.is_admin:
         raise HTTPException(status_code=403)
     
+    if len(password) > MAX_PASSWORD_LENGTH:
+        return RedirectResponse(url="/admin?error=password_too_long", status_code=303)
     if db.query(User).filter(User.username == username).first():
         return RedirectResponse(url="/admin?error=username_exists", status_code=303)
     
@@ -1302,12 +1954,13 @@ def make_me_admin(
 ):
     """Простой маршрут: делает текущего пользователя админом"""
     if not user:
-        return RedirectResponse(url="/login")
+        return RedirectResponse(url="/login", status_code=303)
     
     # Сделать пользователя админом
     user.is_admin = True
     db.commit()
     db.refresh(user)
+    invalidate_user(user.id)
     
     html = f"""
     <!DOCTYPE html>
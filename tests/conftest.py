@@ -0,0 +1,63 @@
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# main.py читает настройки при импорте, а static/templates ищет относительно текущей папки
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/test.sqlite3"
+os.environ.pop("REDIS_URL", None)
+os.chdir(ROOT)
+sys.path.insert(0, ROOT)
+
+import main  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def user_client(client):
+    """Клиент с сессией только что зарегистрированного пользователя"""
+    username = f"user_{uuid.uuid4().hex[:8]}"
+    client.post("/register", data={
+        "username": username,
+        "password": "secret1",
+        "confirm_password": "secret1",
+        "full_name": "Test User",
+    }, follow_redirects=False)
+    response = client.post("/login", data={"username": username, "password": "secret1"}, follow_redirects=False)
+    client.cookies.set("session_token", response.cookies["session_token"])
+    client.username = username
+    return client
+
+
+@pytest.fixture
+def cloudinary_stub(monkeypatch):
+    """Подменяет Cloudinary: файл с содержимым FAIL... не загружается, остальные записываются"""
+    calls = {"uploaded": [], "destroyed": []}
+    
+    def upload_large(file, public_id, resource_type, **kwargs):
+        if file.read().startswith(b"FAIL"):
+            raise RuntimeError("upload failed")
+        calls["uploaded"].append(public_id)
+        return {
+            "secure_url": f"https://res.cloudinary.test/{public_id}",
+            "public_id": public_id,
+            "resource_type": resource_type,
+        }
+    
+    def destroy(public_id, **kwargs):
+        calls["destroyed"].append(public_id)
+    
+    monkeypatch.setattr(main.cloudinary.uploader, "upload_large", upload_large)
+    monkeypatch.setattr(main.cloudinary.uploader, "destroy", destroy)
+    return calls
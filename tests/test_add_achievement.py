@@ -0,0 +1,67 @@
+import main
+
+
+ACHIEVEMENT_FORM = {
+    "achievement_type": "oqushy_status",
+    "title": "Олимпиада",
+    "category": "olympiad",
+    "level": "city",
+    "place": "1",
+}
+
+
+def user_achievements(username):
+    db = main.SessionLocal()
+    try:
+        user = db.query(main.User).filter(main.User.username == username).one()
+        return db.query(main.Achievement).filter(main.Achievement.user_id == user.id).all()
+    finally:
+        db.close()
+
+
+def post_achievement(client, content):
+    return client.post(
+        "/add-achievement",
+        data=ACHIEVEMENT_FORM,
+        files={"file": ("diploma.pdf", content, "application/pdf")},
+        follow_redirects=False,
+    )
+
+
+def test_uploaded_achievement_becomes_pending(user_client, cloudinary_stub):
+    response = post_achievement(user_client, b"diploma")
+    
+    assert response.headers["location"] == "/oqushy-status?success=added"
+    [achievement] = user_achievements(user_client.username)
+    assert achievement.status == "pending"
+    assert achievement.file_path == f"https://res.cloudinary.test/{cloudinary_stub['uploaded'][0]}"
+
+
+def test_failed_upload_leaves_no_achievement(user_client, cloudinary_stub):
+    response = post_achievement(user_client, b"FAIL")
+    
+    assert response.headers["location"] == "/oqushy-status?error=upload_failed"
+    assert user_achievements(user_client.username) == []
+
+
+def test_uploading_achievement_is_hidden(user_client):
+    db = main.SessionLocal()
+    user = db.query(main.User).filter(main.User.username == user_client.username).one()
+    achievement = main.Achievement(
+        user_id=user.id,
+        achievement_type="oqushy_status",
+        title="Ещё загружается",
+        category="olympiad",
+        status=main.ACHIEVEMENT_UPLOADING,
+    )
+    db.add(achievement)
+    db.commit()
+    db.close()
+    
+    assert "Ещё загружается" not in user_client.get("/jeke-cabinet").text
+    assert "Ещё загружается" not in user_client.get("/oqushy-status").text
+    
+    user_client.get("/make-me-admin")
+    assert "Ещё загружается" not in user_client.get("/moderate").text
+    response = user_client.post(f"/achievement/{achievement.id}/approve", follow_redirects=False)
+    assert response.status_code == 404
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+import main
+
+
+def batch_item(**overrides):
+    item = {
+        "achievement_type": "oqushy_status",
+        "title": "Олимпиада",
+        "category": "olympiad",
+        "level": "city",
+        "place": "1",
+    }
+    item.update(overrides)
+    return item
+
+
+def post_batch(client, items, contents):
+    files = [("files", (f"file{i}.pdf", content, "application/pdf")) for i, content in enumerate(contents)]
+    return client.post(
+        "/add-achievements/batch",
+        data={"metadata": json.dumps(items)},
+        files=files,
+        follow_redirects=False,
+    )
+
+
+def user_achievements(username):
+    db = main.SessionLocal()
+    try:
+        user = db.query(main.User).filter(main.User.username == username).one()
+        return db.query(main.Achievement).filter(main.Achievement.user_id == user.id).all()
+    finally:
+        db.close()
+
+
+def test_batch_creates_achievements(user_client, cloudinary_stub):
+    items = [batch_item(title="Первое"), batch_item(title="Второе", level="region", place="2")]
+    response = post_batch(user_client, items, [b"one", b"two"])
+    
+    assert response.status_code == 303
+    assert response.headers["location"] == "/jeke-cabinet?success=added"
+    achievements = user_achievements(user_client.username)
+    assert sorted(a.title for a in achievements) == ["Второе", "Первое"]
+    assert all(a.status == "pending" and a.file_path.startswith("https://") for a in achievements)
+    assert len(cloudinary_stub["uploaded"]) == 2
+
+
+def test_batch_rejects_count_mismatch(user_client, cloudinary_stub):
+    response = post_batch(user_client, [batch_item()], [b"one", b"two"])
+    
+    assert response.status_code == 400
+    assert cloudinary_stub["uploaded"] == []
+    assert user_achievements(user_client.username) == []
+
+
+@pytest.mark.parametrize("overrides", [
+    {"level": ["city"]},
+    {"title": {"a": 1}},
+    {"place": 1},
+    {"category": ""},
+])
+def test_batch_rejects_bad_field_types(user_client, cloudinary_stub, overrides):
+    response = post_batch(user_client, [batch_item(**overrides)], [b"one"])
+    
+    assert response.status_code == 400
+    assert cloudinary_stub["uploaded"] == []
+    assert user_achievements(user_client.username) == []
+
+
+def test_batch_discards_uploaded_files_when_one_fails(user_client, cloudinary_stub):
+    response = post_batch(user_client, [batch_item(), batch_item()], [b"one", b"FAIL"])
+    
+    assert response.status_code == 303
+    assert response.headers["location"] == "/jeke-cabinet?error=upload_failed"
+    assert cloudinary_stub["destroyed"] == cloudinary_stub["uploaded"]
+    assert len(cloudinary_stub["destroyed"]) == 1
+    assert user_achievements(user_client.username) == []